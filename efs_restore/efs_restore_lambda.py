@@ -1,12 +1,44 @@
-import glob
+import errno
+import fnmatch
 import logging
 import os
-import shutil
+import re
+import stat
 import time
-from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+_info = logger.info
+
+# Read and compile the restore pattern once per sandbox so warm
+# invocations reuse it
+_PATTERN = os.environ.get('RESTORE_DIRECTORY_PATTERN', 'aws-backup-restore_*')
+_PATTERN_RE = re.compile(fnmatch.translate(_PATTERN))
+
+# Errors meaning a copy syscall can't handle this pair of files
+_COPY_FALLBACK_ERRNOS = (
+    errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL
+)
+
+
+def get_max_workers():
+    """Read the number of concurrent moves from the environment"""
+    value = os.environ.get('MOVE_MAX_WORKERS', '32')
+    try:
+        max_workers = float(value)
+    except ValueError:
+        max_workers = None
+
+    # CloudFormation Number parameters may arrive as e.g. "8.0"
+    if max_workers is None or not max_workers.is_integer() or max_workers < 1:
+        raise Exception(
+            f"MOVE_MAX_WORKERS must be a positive integer, got '{value}'"
+        )
+
+    return int(max_workers)
 
 
 def log_progress(message, extra=None):
@@ -17,24 +49,32 @@ def log_progress(message, extra=None):
         logger.info(message)
 
 
-def find_restore_directories(pattern):
+def find_restore_directories():
     """Find directories matching the restore pattern"""
     try:
-        efs_root = Path('/mnt/efs')
-        if not efs_root.exists():
-            raise Exception("EFS root directory /mnt/efs does not exist")
-
-        # Convert glob pattern to search pattern
-        search_pattern = str(efs_root / pattern)
-        matching_dirs = glob.glob(search_pattern)
-
-        # Filter to only include directories
-        restore_dirs = [d for d in matching_dirs if os.path.isdir(d)]
+        efs_root = '/mnt/efs'
+        restore_dirs = []
+
+        # Match names while listing the EFS root once, rather than globbing
+        # and then stat-ing each result again
+        try:
+            with os.scandir(efs_root) as entries:
+                for entry in entries:
+                    if (_PATTERN_RE.match(entry.name)
+                            and entry.is_dir(follow_symlinks=False)):
+                        restore_dirs.append(entry.path)
+                        # More than one match is an error, stop looking
+                        if len(restore_dirs) > 1:
+                            break
+        except FileNotFoundError:
+            raise Exception(
+                f"EFS root directory {efs_root} does not exist"
+            ) from None
 
         log_progress(
             f"Found {len(restore_dirs)} directories matching pattern "
-            f"'{pattern}'",
-            {'pattern': pattern, 'directories': restore_dirs}
+            f"'{_PATTERN}'",
+            {'pattern': _PATTERN, 'directories': restore_dirs}
         )
 
         return restore_dirs
@@ -45,91 +85,182 @@ def find_restore_directories(pattern):
         raise
 
 
-def check_for_conflicts(source_dir, target_root):
-    """Check if moving files would create conflicts"""
-    conflicts = []
-    source_path = Path(source_dir)
-    target_path = Path(target_root)
-
+def _copy_file_contents(src_fd, dst_fd):
+    """Copy file data in the kernel where possible, else via userspace"""
+    # copy_file_range refuses some filesystem pairs (EXDEV across
+    # filesystem types on Linux 5.19+), so fall back to sendfile and then
+    # a plain read/write loop, as shutil does
+    offset = 0
     try:
-        for item in source_path.rglob('*'):
-            if item.is_file() or item.is_dir():
-                relative_path = item.relative_to(source_path)
-                target_item = target_path / relative_path
+        while copied := os.copy_file_range(src_fd, dst_fd, 2**30):
+            offset += copied
+        return
+    except OSError as e:
+        if e.errno not in _COPY_FALLBACK_ERRNOS:
+            raise
 
-                if target_item.exists():
-                    conflicts.append(str(relative_path))
-
-        if conflicts:
-            log_progress(f"Found {len(conflicts)} conflicts",
-                         {'conflicts': conflicts})
-
-        return conflicts
-
-    except Exception as e:
-        log_progress(f"Error checking for conflicts: {str(e)}",
-                     {'error': str(e)})
-        raise
+    try:
+        while copied := os.sendfile(dst_fd, src_fd, offset, 2**30):
+            offset += copied
+        return
+    except OSError as e:
+        if e.errno not in _COPY_FALLBACK_ERRNOS:
+            raise
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    while data := os.read(src_fd, 2**20):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def _fast_move(source, target):
+    """Rename source to target, copying the file across devices"""
+    try:
+        os.rename(source, target)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Only a regular file can be copied this way
+        st = os.lstat(source)
+        if not stat.S_ISREG(st.st_mode):
+            raise
+
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(
+            target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IMODE(st.st_mode)
+        )
+        try:
+            _copy_file_contents(src_fd, dst_fd)
+            # Preserve permissions and attributes as rename would
+            os.fchown(dst_fd, st.st_uid, st.st_gid)
+            os.fchmod(dst_fd, stat.S_IMODE(st.st_mode))
+            os.utime(dst_fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except BaseException:
+            os.close(dst_fd)
+            os.unlink(target)
+            raise
+        os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    os.unlink(source)
+
+
+def move_item(source, target):
+    """Rename a single item, refusing to replace an existing target"""
+    # rename(2) silently replaces an existing file or empty directory, so
+    # check the target first; EEXIST/ENOTEMPTY from the rename itself still
+    # catch a non-empty directory appearing in between
+    if os.path.lexists(target):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), target)
+
+    # Atomic rename within the EFS mount, kernel-side copy across devices
+    _fast_move(source, target)
 
 
 def move_contents(source_dir, target_root):
     """Move all contents from source directory to target root"""
     try:
-        source_path = Path(source_dir)
-        target_path = Path(target_root)
-
-        moved_items = []
+        moved_count = 0
         failed_items = []
+        conflicts = []
+        max_workers = get_max_workers()
 
-        # Get all items in source directory
-        items = list(source_path.iterdir())
-        total_items = len(items)
+        # List the names before moving anything; renaming entries out of
+        # a directory while it is being read can skip or repeat entries
+        # on NFS
+        names = os.listdir(source_dir)
+        total_items = len(names)
 
         log_progress(
             f"Starting to move {total_items} items from {source_dir} "
-            f"to {target_root}"
+            f"to {target_root} using {max_workers} workers"
         )
 
-        for i, item in enumerate(items, 1):
-            try:
-                target_item = target_path / item.name
-
-                # Use shutil.move for atomic move operation
-                shutil.move(str(item), str(target_item))
-                moved_items.append(item.name)
-
-                # Log progress every 10 items
-                if i % 10 == 0 or i == total_items:
-                    log_progress(
-                        f"Progress: {i}/{total_items} items moved",
-                        {
-                            'moved': len(moved_items),
-                            'failed': len(failed_items)
-                        }
+        # Build paths by string concatenation rather than os.path.join
+        # on every item
+        source_prefix = source_dir.rstrip('/') + '/'
+        target_prefix = target_root.rstrip('/') + '/'
+
+        # Each rename is an NFS round trip, so keep several in flight, but
+        # bound the number of pending futures so memory stays flat however
+        # many items there are
+        max_pending = 2 * max_workers
+        processed = 0
+        remaining = iter(names)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            while True:
+                for name in remaining:
+                    future = executor.submit(
+                        move_item, source_prefix + name, target_prefix + name
                     )
-
-            except Exception as e:
-                failed_items.append({'item': item.name, 'error': str(e)})
-                log_progress(
-                    f"Failed to move {item.name}: {str(e)}",
-                    {'item': item.name, 'error': str(e)}
-                )
+                    pending[future] = name
+                    if len(pending) >= max_pending:
+                        break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    processed += 1
+                    try:
+                        future.result()
+                        moved_count += 1
+
+                    except Exception as e:
+                        if getattr(e, 'errno', None) in (
+                            errno.EEXIST, errno.ENOTEMPTY
+                        ):
+                            conflicts.append(name)
+                        else:
+                            error = str(e)
+                            failed_items.append((name, error))
+                            _info(f"Failed to move {name}: {error}")
+
+                    # Log progress every 1000 items
+                    if processed % 1000 == 0:
+                        _info(
+                            f"Progress: {processed}/{total_items} items "
+                            f"processed (moved: {moved_count}, "
+                            f"failed: {len(failed_items)}, "
+                            f"conflicts: {len(conflicts)})"
+                        )
 
         log_progress(
             "Move operation completed",
             {
                 'total_items': total_items,
-                'moved': len(moved_items),
-                'failed': len(failed_items)
+                'moved': moved_count,
+                'failed': len(failed_items),
+                'conflicts': len(conflicts)
             }
         )
 
-        if failed_items:
-            raise Exception(
-                f"Failed to move {len(failed_items)} items: {failed_items}"
+        # Items without a conflict have already been moved at this point,
+        # so report every conflict and failure together
+        errors = []
+        if conflicts:
+            errors.append(
+                f"Conflicts detected. The following files/directories "
+                f"already exist in {target_root}: {conflicts}"
             )
 
-        return moved_items
+        if failed_items:
+            failed = [
+                {'item': name, 'error': error} for name, error in failed_items
+            ]
+            errors.append(f"Failed to move {len(failed)} items: {failed}")
+
+        if errors:
+            raise Exception("; ".join(errors))
+
+        return moved_count
 
     except Exception as e:
         log_progress(f"Error moving contents: {str(e)}", {'error': str(e)})
@@ -139,15 +270,16 @@ def move_contents(source_dir, target_root):
 def cleanup_empty_directory(directory):
     """Remove the empty restore directory"""
     try:
-        source_path = Path(directory)
+        # rmdir(2) refuses a non-empty directory, so let it do the check
+        try:
+            os.rmdir(directory)
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                raise Exception(
+                    f"Directory {directory} is not empty, cannot remove"
+                ) from e
+            raise
 
-        # Verify directory is empty
-        if any(source_path.iterdir()):
-            raise Exception(
-                f"Directory {directory} is not empty, cannot remove"
-            )
-
-        source_path.rmdir()
         log_progress(f"Successfully removed empty directory: {directory}")
 
     except Exception as e:
@@ -178,18 +310,14 @@ def handle(event, context):
             }
         )
 
-        # Get restore directory pattern from environment
-        restore_pattern = os.environ.get(
-            'RESTORE_DIRECTORY_PATTERN', 'aws-backup-restore_*'
-        )
-        log_progress(f"Using restore directory pattern: {restore_pattern}")
+        log_progress(f"Using restore directory pattern: {_PATTERN}")
 
         # Find restore directories
-        restore_dirs = find_restore_directories(restore_pattern)
+        restore_dirs = find_restore_directories()
 
         if not restore_dirs:
             error_msg = (
-                f"No directories found matching pattern '{restore_pattern}' "
+                f"No directories found matching pattern '{_PATTERN}' "
                 f"in /mnt/efs"
             )
             log_progress(error_msg)
@@ -206,18 +334,8 @@ def handle(event, context):
         restore_dir = restore_dirs[0]
         log_progress(f"Processing restore directory: {restore_dir}")
 
-        # Check for conflicts
-        conflicts = check_for_conflicts(restore_dir, '/mnt/efs')
-        if conflicts:
-            error_msg = (
-                f"Conflicts detected. The following files/directories "
-                f"already exist in /mnt/efs: {conflicts}"
-            )
-            log_progress(error_msg)
-            raise Exception(error_msg)
-
         # Move contents
-        moved_items = move_contents(restore_dir, '/mnt/efs')
+        moved_count = move_contents(restore_dir, '/mnt/efs')
 
         # Clean up empty directory
         cleanup_empty_directory(restore_dir)
@@ -231,9 +349,8 @@ def handle(event, context):
                     'Successfully moved restore directory contents to EFS root'
                 ),
                 'restore_directory': restore_dir,
-                'moved_items_count': len(moved_items),
-                'execution_time_seconds': round(execution_time, 2),
-                'moved_items': moved_items
+                'moved_items_count': moved_count,
+                'execution_time_seconds': round(execution_time, 2)
             }
         }
 
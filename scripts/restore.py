@@ -1,10 +1,13 @@
 import boto3
+from botocore.config import Config
 
 file_system_id = "fs-xxx"
 security_group_id = "sg-xxx"
 subnet_id = "subnet-xxx"
 
-cfn = boto3.client("cloudformation")
+config = Config(tcp_keepalive=True, retries={"max_attempts": 5, "mode": "adaptive"})
+session = boto3.Session()
+cfn = session.client("cloudformation", config=config)
 
 cfn.create_stack(
     StackName="efs-restore-stack",
@@ -18,7 +21,9 @@ cfn.create_stack(
 )
 
 waiter = cfn.get_waiter("stack_create_complete")
-waiter.wait(StackName="efs-restore-stack")
+waiter.wait(
+    StackName="efs-restore-stack", WaiterConfig={"Delay": 5, "MaxAttempts": 120}
+)
 
 
 def get_lambda_function_name():
@@ -31,7 +36,7 @@ def get_lambda_function_name():
 
 
 fn = get_lambda_function_name()
-lambda_ = boto3.client("lambda")
+lambda_ = session.client("lambda", config=config)
 response = lambda_.invoke(FunctionName=fn)
 print(response)
 
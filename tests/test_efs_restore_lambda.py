@@ -0,0 +1,105 @@
+import os
+import tempfile
+
+import pytest
+
+from efs_restore import efs_restore_lambda
+
+
+@pytest.fixture
+def tmpfs_path():
+    if not os.path.isdir("/dev/shm"):
+        pytest.skip("/dev/shm is not available")
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as path:
+        yield path
+
+
+def test_move_item_across_filesystems(tmpfs_path, tmp_path):
+    if os.stat(tmpfs_path).st_dev == os.stat(tmp_path).st_dev:
+        pytest.skip("/dev/shm and the test directory share a filesystem")
+
+    source = os.path.join(tmpfs_path, "data.bin")
+    target = str(tmp_path / "data.bin")
+    payload = os.urandom(3 * 2**20 + 17)
+    with open(source, "wb") as f:
+        f.write(payload)
+    os.chmod(source, 0o640)
+    os.utime(source, ns=(1_000_000_000, 2_000_000_000))
+
+    efs_restore_lambda.move_item(source, target)
+
+    assert not os.path.lexists(source)
+    with open(target, "rb") as f:
+        assert f.read() == payload
+    st = os.stat(target)
+    assert st.st_mode & 0o7777 == 0o640
+    assert st.st_mtime_ns == 2_000_000_000
+
+
+def test_move_item_across_filesystems_refuses_existing_target(tmpfs_path, tmp_path):
+    source = os.path.join(tmpfs_path, "data.bin")
+    target = tmp_path / "data.bin"
+    with open(source, "wb") as f:
+        f.write(b"new")
+    target.write_bytes(b"old")
+
+    with pytest.raises(FileExistsError):
+        efs_restore_lambda.move_item(source, str(target))
+
+    assert os.path.exists(source)
+    assert target.read_bytes() == b"old"
+
+
+@pytest.fixture
+def restore_tree(tmp_path):
+    source = tmp_path / "aws-backup-restore_1"
+    source.mkdir()
+    for i in range(50):
+        (source / f"file{i}").write_text(str(i))
+    (source / "nested").mkdir()
+    (source / "nested" / "inner").write_text("inner")
+    return source
+
+
+def test_move_contents_moves_every_item(monkeypatch, tmp_path, restore_tree):
+    monkeypatch.setenv("MOVE_MAX_WORKERS", "2")
+    pending_sizes = []
+    real_wait = efs_restore_lambda.wait
+
+    def recording_wait(futures, **kwargs):
+        pending_sizes.append(len(futures))
+        return real_wait(futures, **kwargs)
+
+    monkeypatch.setattr(efs_restore_lambda, "wait", recording_wait)
+
+    moved = efs_restore_lambda.move_contents(str(restore_tree), str(tmp_path))
+
+    assert moved == 51
+    assert os.listdir(restore_tree) == []
+    assert (tmp_path / "file7").read_text() == "7"
+    assert (tmp_path / "nested" / "inner").read_text() == "inner"
+    assert max(pending_sizes) <= 4
+
+
+def test_move_contents_reports_conflicts_and_failures(
+    monkeypatch, tmp_path, restore_tree
+):
+    (tmp_path / "file1").write_text("existing")
+    real_move_item = efs_restore_lambda.move_item
+
+    def failing_move_item(source, target):
+        if source.endswith("/file2"):
+            raise PermissionError(13, "Permission denied", source)
+        real_move_item(source, target)
+
+    monkeypatch.setattr(efs_restore_lambda, "move_item", failing_move_item)
+
+    with pytest.raises(Exception) as excinfo:
+        efs_restore_lambda.move_contents(str(restore_tree), str(tmp_path))
+
+    message = str(excinfo.value)
+    assert "['file1']" in message
+    assert "Failed to move 1 items" in message
+    assert "'item': 'file2'" in message
+    assert (tmp_path / "file1").read_text() == "existing"
+    assert sorted(os.listdir(restore_tree)) == ["file1", "file2"]